@@ -1,33 +1,226 @@
 import json
+import glob
 import os
 import sys
 import time
 import logging
+import threading
 import boto3
+from botocore.config import Config
 from typing import Dict, Any
 from lambda_snaploader import load_libraries_from_s3
 
-# Configure logging
+# orjson is a Rust-implemented drop-in JSON codec, several times faster
+# than stdlib json on small payloads; keep stdlib as a fallback so the
+# module still works in local test environments without it
+try:
+    import orjson
+
+    def _json_loads(data):
+        return orjson.loads(data or b'{}')
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    orjson = None
+
+    def _json_loads(data):
+        return json.loads(data or '{}')
+
+    def _json_dumps(obj):
+        return json.dumps(obj)
+
+# Configure logging; in Lambda, drop to WARNING unless VERBOSE=1 so the
+# hot path does not pay for formatting info records
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') and os.environ.get('VERBOSE') != '1':
+    logger.setLevel(logging.WARNING)
+else:
+    logger.setLevel(logging.INFO)
 
 # Global variables
 pytorch_module = None
 model = None
+bf16_autocast = False
+
+# Preallocated input buffer for the fixed 10-element input shape, plus a
+# numpy view for cheap element-wise fills (created once torch is loaded)
+_input_buf = None
+_input_np = None
+
+def _select_target_dir():
+    """
+    Prefer tmpfs-backed /dev/shm when it is mounted and writable, so
+    dlopen maps the libraries straight from RAM with no disk writeback;
+    sandboxes without it fall back to /tmp
+    """
+    if os.path.ismount('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm/libs_so'
+    return '/tmp/libs_so'
+
+# Target directory for libraries loaded by lambda-snaploader
+TARGET_DIR = _select_target_dir()
+
+# Where the PyTorch libraries come from: 's3' downloads the archive via
+# lambda-snaploader, 'layer' expects a Lambda Layer mounted at /opt/python
+# (published with package_pytorch.py --layer) and skips S3 entirely
+PYTORCH_SRC = os.environ.get('PYTORCH_SRC', 's3')
+
+# S3 client built once at import and reused everywhere: avoids the
+# credential chain walk and TLS handshake on later calls, and the larger
+# connection pool allows concurrent range GETs during the cold-start
+# download
+_s3_client = boto3.client('s3', config=Config(
+    max_pool_connections=32,
+    tcp_keepalive=True,
+    retries={'max_attempts': 2, 'mode': 'standard'}
+))
+
+# Point Inductor at the cache shipped in the bundle before torch is ever
+# imported, so torch.compile reuses the kernels built at package time
+os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', f'{TARGET_DIR}/inductor')
+
+# Pin the OpenMP/MKL pools before torch is imported: for the tiny demo
+# MLP the per-layer fork/join cost dwarfs the actual FLOPs. Set
+# TORCH_NUM_THREADS to size the pools for larger models, or to 0 to
+# leave torch's defaults alone; setdefault keeps explicit OMP_* settings
+# from the environment intact either way
+_TORCH_THREADS = os.environ.get('TORCH_NUM_THREADS', '1')
+if _TORCH_THREADS != '0':
+    os.environ.setdefault('OMP_NUM_THREADS', _TORCH_THREADS)
+    os.environ.setdefault('MKL_NUM_THREADS', _TORCH_THREADS)
+    os.environ.setdefault('OMP_WAIT_POLICY', 'PASSIVE')
+
+def _library_file_filter(name):
+    """
+    Filter for files exposed under TARGET_DIR: shared libraries, the
+    precompiled TorchScript model artifacts, the pure-Python zipimport
+    archive, and the Inductor kernel cache
+    """
+    return (
+        name.endswith('.so') or
+        '.so.' in name or
+        name.endswith('.pt') or
+        name.endswith('.pyz') or
+        name.startswith('inductor/')
+    )
+
+def _fetch_libraries():
+    """
+    Download and set up the PyTorch libraries from S3 into TARGET_DIR
+    """
+    bucket_name = os.environ.get('PYTORCH_BUCKET')
+    key = os.environ.get('PYTORCH_KEY')
+
+    if not bucket_name or not key:
+        logger.error("Environment variables not set: PYTORCH_BUCKET=%s, PYTORCH_KEY=%s", bucket_name, key)
+        raise ValueError("Required environment variables not set: PYTORCH_BUCKET or PYTORCH_KEY")
+
+    logger.info("Loading from S3: s3://%s/%s", bucket_name, key)
+
+    return load_libraries_from_s3(
+        bucket=bucket_name,
+        key=key,
+        target_dir=TARGET_DIR,
+        file_filter=_library_file_filter,
+        s3_client=_s3_client
+    )
+
+# The S3 download releases the GIL during socket reads, so kicking it off
+# on a background thread the moment the module starts importing overlaps
+# the network I/O with the rest of the runtime's Python bootstrap
+_prefetch_result = {}
+
+def _prefetch_s3():
+    try:
+        _prefetch_result['success'] = _fetch_libraries()
+    except Exception as e:
+        logger.error("Background S3 prefetch failed: %s", e)
+        _prefetch_result['success'] = False
+        _prefetch_result['error'] = e
+
+_prefetch_thread = threading.Thread(target=_prefetch_s3, daemon=True)
+if PYTORCH_SRC != 'layer':
+    _prefetch_thread.start()
+
+def _cpu_supports_bf16(torch):
+    """
+    Check for AVX-512 BF16 support; autocast on older hosts is a slowdown
+    """
+    for attr in ('_is_avx512_bf16_supported', '_is_cpu_support_avx512_bf16'):
+        check = getattr(torch.cpu, attr, None)
+        if check is not None:
+            try:
+                return bool(check())
+            except Exception:
+                return False
+    return False
+
+def _add_site_pyz(lib_dir):
+    """
+    Put the pure-Python zipimport archive on sys.path when the bundle
+    ships one: a single open() and zip-directory lookup replaces
+    thousands of per-file syscalls during import
+    """
+    site_pyz = f"{lib_dir}/site.pyz"
+    if os.path.exists(site_pyz) and site_pyz not in sys.path:
+        sys.path.insert(0, site_pyz)
+        logger.info("Added %s to sys.path", site_pyz)
+
+def _forward(torch, model, input_tensor):
+    """
+    Run one forward pass under the execution contexts the request path
+    uses: optimized TorchScript executor, no autograd bookkeeping, and
+    BF16 autocast when IPEX enabled it
+    """
+    with torch.jit.optimized_execution(True), torch.no_grad():
+        if bf16_autocast:
+            with torch.cpu.amp.autocast(dtype=torch.bfloat16):
+                return model(input_tensor)
+        return model(input_tensor)
+
+def _warmup(torch, model, iterations=3):
+    """
+    Run dummy forwards during init so one-time lazy setup — oneDNN
+    primitive caches, fuser compilation, allocator warmup — never lands
+    on a real request; the repeat runs push the JIT past profiling onto
+    the static executor. Uses _forward so the warmed primitives match
+    the contexts (including BF16 autocast) real requests run under
+    """
+    for _ in range(iterations):
+        _forward(torch, model, torch.zeros(10, dtype=torch.float32))
+
+def _prefetch_shared_objects(target_dir):
+    """
+    Ask the kernel to read ahead every shared library under target_dir so
+    the pages are already cached when import torch dlopens them
+    """
+    count = 0
+    for path in glob.glob(f"{target_dir}/**/*.so*", recursive=True):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+            count += 1
+        except OSError as e:
+            logger.debug("Readahead failed for %s: %s", path, e)
+    logger.info("Issued readahead for %d shared libraries", count)
 
 # Log initialization information
-logger.info(f"Python version: {sys.version}")
-logger.info(f"System paths: {sys.path}")
-logger.info(f"Current working directory: {os.getcwd()}")
-logger.info(f"Environment variables: LD_LIBRARY_PATH={os.environ.get('LD_LIBRARY_PATH', 'Not set')}")
-logger.info(f"Environment variables: LD_PRELOAD={os.environ.get('LD_PRELOAD', 'Not set')}")
+logger.info("Python version: %s", sys.version)
+logger.info("System paths: %s", sys.path)
+logger.info("Current working directory: %s", os.getcwd())
+logger.info("Environment variables: LD_LIBRARY_PATH=%s", os.environ.get('LD_LIBRARY_PATH', 'Not set'))
+logger.info("Environment variables: LD_PRELOAD=%s", os.environ.get('LD_PRELOAD', 'Not set'))
 
 def load_pytorch():
     """
     Load PyTorch library from S3 using lambda-snaploader
     """
-    global pytorch_module, model
-    
+    global pytorch_module, model, bf16_autocast, _input_buf, _input_np
+
     # If PyTorch is already loaded, return immediately
     if pytorch_module is not None:
         logger.info("PyTorch is already loaded, skipping initialization")
@@ -35,57 +228,146 @@ def load_pytorch():
     
     start_time = time.time()
     logger.info("Starting PyTorch library initialization")
-    
-    # Get environment variables
-    bucket_name = os.environ.get('PYTORCH_BUCKET')
-    key = os.environ.get('PYTORCH_KEY')
-    
-    if not bucket_name or not key:
-        logger.error(f"Environment variables not set: PYTORCH_BUCKET={bucket_name}, PYTORCH_KEY={key}")
-        raise ValueError("Required environment variables not set: PYTORCH_BUCKET or PYTORCH_KEY")
-    
-    logger.info(f"Loading from S3: s3://{bucket_name}/{key}")
-    
+
     try:
-        # Setup library from S3 using lambda-snaploader
-        target_dir = '/tmp/libs_so'
-        setup_result = load_libraries_from_s3(
-            bucket=bucket_name,
-            key=key,
-            target_dir=target_dir
-        )
-        
-        if not setup_result:
-            logger.error("Failed to setup PyTorch library from S3")
-            return False
-        
-        logger.info("Library setup complete, importing PyTorch")
-        
+        if PYTORCH_SRC == 'layer':
+            # Libraries come from a Lambda Layer mounted at /opt/python,
+            # fetched once by the control plane and usually cached on the
+            # sandbox host — no S3 download at all
+            model_dir = '/opt/python'
+            if model_dir not in sys.path:
+                sys.path.insert(0, model_dir)
+            logger.info("Using PyTorch from Lambda Layer at %s", model_dir)
+            _add_site_pyz(model_dir)
+        else:
+            model_dir = TARGET_DIR
+
+            # Wait for the background prefetch kicked off at module import;
+            # fall back to a synchronous fetch if it failed or never ran
+            if _prefetch_thread.is_alive():
+                logger.info("Waiting for background S3 prefetch to complete")
+                _prefetch_thread.join()
+
+            setup_result = _prefetch_result.get('success')
+            if not setup_result:
+                logger.warning("Background prefetch did not succeed, fetching synchronously")
+                setup_result = _fetch_libraries()
+
+            if not setup_result:
+                logger.error("Failed to setup PyTorch library from S3")
+                return False
+
+            logger.info("Library setup complete, importing PyTorch")
+            _add_site_pyz(TARGET_DIR)
+
+            # Prime the page cache for the extracted .so files on a worker
+            # thread; the dlopens inside import torch release the GIL, so
+            # the readahead runs concurrently with the import
+            readahead_thread = threading.Thread(
+                target=_prefetch_shared_objects, args=(TARGET_DIR,), daemon=True
+            )
+            readahead_thread.start()
+
         # Import PyTorch
         import_start = time.time()
         import torch
         pytorch_module = torch
         import_time = time.time() - import_start
-        logger.info(f"PyTorch import complete, took {import_time:.2f} seconds")
+        logger.info("PyTorch import complete, took %.2f seconds", import_time)
         
-        # Create a simple model for testing
+        # Intra-op parallelism is pure overhead for this tiny MLP; int8
+        # kernels in particular regress badly with default multi-threading
+        if _TORCH_THREADS != '0':
+            torch.set_num_threads(int(_TORCH_THREADS))
+            try:
+                torch.set_num_interop_threads(int(_TORCH_THREADS))
+            except RuntimeError:
+                # The interop pool can only be sized before it starts
+                logger.debug("Interop thread pool already started, leaving its size alone")
+
+        # Allocate the reusable input buffer once; requests fill it in
+        # place instead of building a fresh tensor from a Python list
+        _input_buf = torch.empty((10,), dtype=torch.float32)
+        _input_np = _input_buf.numpy()
+
+        # Load the precompiled TorchScript model shipped in the zip,
+        # preferring the dynamically quantized int8 variant; freezing
+        # inlines the weights as constants into the graph
         model_start = time.time()
-        model = torch.nn.Sequential(
-            torch.nn.Linear(10, 5),
-            torch.nn.ReLU(),
-            torch.nn.Linear(5, 1)
-        )
+        model_path = f"{model_dir}/model_int8.pt"
+        if not os.path.exists(model_path):
+            model_path = f"{model_dir}/model.pt"
+        # TORCH_COMPILE=1 deliberately skips the TorchScript artifact so
+        # the eager + torch.compile path (and the bundled Inductor cache)
+        # is reachable even though every archive ships the .pt files
+        if os.path.exists(model_path) and os.environ.get('TORCH_COMPILE') != '1':
+            # Pick the static executor/fuser path up front; the profiling
+            # executor has nothing to learn about a fixed 10-element shape
+            torch._C._jit_set_profiling_executor(False)
+            torch._C._jit_set_profiling_mode(False)
+
+            model = torch.jit.load(model_path)
+            model.eval()
+            model = torch.jit.freeze(model)
+            try:
+                model = torch.jit.optimize_for_inference(model)
+            except Exception as e:
+                # Not all frozen graphs are supported (e.g. the int8
+                # variant on some torch versions); freezing alone is fine
+                logger.debug("optimize_for_inference skipped: %s", e)
+
+            logger.info("Loaded TorchScript model from %s", model_path)
+        else:
+            # Build the model in eager mode: either the packaged artifact
+            # is missing (older zips) or TORCH_COMPILE=1 asked for it
+            if os.environ.get('TORCH_COMPILE') == '1':
+                logger.info("TORCH_COMPILE=1 set, building eager model for torch.compile")
+            else:
+                logger.warning("TorchScript model not found at %s, building eager model", model_path)
+            model = torch.nn.Sequential(
+                torch.nn.Linear(10, 5),
+                torch.nn.ReLU(),
+                torch.nn.Linear(5, 1)
+            )
+            model.eval()
+
+            # IPEX swaps in oneDNN kernels for the eager fallback; BF16
+            # halves weight bandwidth but only pays off with AVX-512 BF16
+            try:
+                import intel_extension_for_pytorch as ipex
+                if _cpu_supports_bf16(torch):
+                    model = ipex.optimize(model, dtype=torch.bfloat16)
+                    bf16_autocast = True
+                    logger.info("Enabled IPEX optimization with BF16")
+                else:
+                    model = ipex.optimize(model)
+                    logger.info("Enabled IPEX optimization (FP32, no AVX-512 BF16 support)")
+            except ImportError:
+                logger.info("intel_extension_for_pytorch not bundled, skipping IPEX optimization")
+
+            # Opt-in torch.compile path; hydrates kernels from the
+            # TORCHINDUCTOR_CACHE_DIR shipped in the bundle
+            if os.environ.get('TORCH_COMPILE') == '1':
+                model = torch.compile(model, mode='reduce-overhead', dynamic=False)
+                with torch.no_grad():
+                    model(torch.zeros(10, dtype=torch.float32))
+                logger.info("Compiled model with torch.compile")
+
+        # Warm up whichever model we ended up with; under SnapStart the
+        # cost is paid once at snapshot time, not per cold start
+        _warmup(torch, model)
         model_time = time.time() - model_start
-        logger.info(f"Model creation complete, took {model_time:.2f} seconds")
+        logger.info("Model loading complete, took %.2f seconds", model_time)
         
-        logger.info(f"PyTorch library loaded successfully, version: {torch.__version__}")
-        logger.info(f"Total initialization time: {time.time() - start_time:.2f} seconds")
+        logger.info("PyTorch library loaded successfully, version: %s", torch.__version__)
+        logger.info("Total initialization time: %.2f seconds", time.time() - start_time)
         
         return True
     except Exception as e:
-        logger.error(f"Failed to load PyTorch library: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.error("Failed to load PyTorch library: %s", e)
+        if logger.isEnabledFor(logging.ERROR):
+            import traceback
+            logger.error(traceback.format_exc())
         return False
 
 
@@ -95,7 +377,7 @@ def run_inference(input_data):
     """
     global pytorch_module, model
     
-    logger.info(f"Running inference, input data: {input_data[:5]}...")
+    logger.info("Running inference, input data: %s...", input_data[:5])
     
     if pytorch_module is None or model is None:
         logger.warning("PyTorch or model not loaded, attempting to reload")
@@ -103,14 +385,19 @@ def run_inference(input_data):
             return {"error": "Failed to load PyTorch"}
     
     try:
-        # Convert input data to tensor
-        input_tensor = pytorch_module.tensor(input_data, dtype=pytorch_module.float32)
-        logger.debug(f"Created input tensor: {input_tensor.shape}, {input_tensor.dtype}")
+        # Fill the preallocated buffer in place for the standard 10-element
+        # shape; fall back to a fresh tensor for other input sizes
+        if _input_np is not None and len(input_data) == 10:
+            _input_np[:] = input_data
+            input_tensor = _input_buf
+        else:
+            input_tensor = pytorch_module.tensor(input_data, dtype=pytorch_module.float32)
+        logger.debug("Created input tensor: %s, %s", input_tensor.shape, input_tensor.dtype)
         
-        # Run inference
-        with pytorch_module.no_grad():
-            output = model(input_tensor)
-        logger.debug(f"Inference result: {output}")
+        # Run inference under the shared execution contexts (optimized
+        # TorchScript executor, no autograd, BF16 autocast when enabled)
+        output = _forward(pytorch_module, model, input_tensor)
+        logger.debug("Inference result: %s", output)
         
         # Add PyTorch version information
         result = {
@@ -118,12 +405,13 @@ def run_inference(input_data):
             "pytorch_version": pytorch_module.__version__,
             "device": str(pytorch_module.device("cpu"))
         }
-        logger.info(f"Inference complete: {result}")
+        logger.info("Inference complete: %s", result)
         return result
     except Exception as e:
-        logger.error(f"Inference failed: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.error("Inference failed: %s", e)
+        if logger.isEnabledFor(logging.ERROR):
+            import traceback
+            logger.error(traceback.format_exc())
         return {"error": f"Inference failed: {str(e)}"}
 
 # Initialize PyTorch during module initialization
@@ -132,36 +420,38 @@ try:
     load_pytorch()
     logger.info("PyTorch initialization complete")
 except Exception as e:
-    logger.error(f"Failed to load PyTorch during initialization: {str(e)}")
+    logger.error("Failed to load PyTorch during initialization: %s", e)
     # Don't raise exception, let the function continue initializing
 
 def lambda_handler(event, context):
     """
     Lambda function handler
     """
-    logger.info(f"Processing request: {event}")
+    logger.info("Processing request: %s", event)
     
     # Get input data from request, use default if not provided
     try:
-        body = json.loads(event.get('body', '{}'))
+        body = _json_loads(event.get('body'))
         input_data = body.get('input', [0.1] * 10)
-        logger.info(f"Parsed input data: {input_data[:5]}...")
+        logger.info("Parsed input data: %s...", input_data[:5])
     except Exception as e:
-        logger.error(f"Failed to parse input data: {e}")
+        logger.error("Failed to parse input data: %s", e)
         input_data = [0.1] * 10
-        logger.info(f"Using default input data: {input_data}")
+        logger.info("Using default input data: %s", input_data)
     
     # Run inference
     result = run_inference(input_data)
-    
-    # Return result
+
+    # Return result; the payload is serialized exactly once and only the
+    # status code is logged, never the full response
+    pytorch_loaded = pytorch_module is not None
     response = {
         "statusCode": 200,
-        "body": json.dumps({
+        "body": _json_dumps({
             "message": "PyTorch inference complete",
-            "pytorch_loaded": pytorch_module is not None,
+            "pytorch_loaded": pytorch_loaded,
             "result": result
         })
     }
-    logger.info(f"Returning response: {response}")
+    logger.info("Returning statusCode=%d", response["statusCode"])
     return response
\ No newline at end of file
@@ -33,6 +33,9 @@ setup(
     install_requires=[
         "boto3>=1.24.0",
     ],
+    extras_require={
+        "zstd": ["zstandard>=0.21.0"],
+    },
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",
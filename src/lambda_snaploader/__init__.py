@@ -9,22 +9,24 @@ from .snapstart import register_snapstart_hook
 __version__ = "0.1.0"
 
 def load_libraries_from_s3(
-    bucket, 
-    key, 
+    bucket,
+    key,
     base_path='/var/task',
-    target_dir='/tmp/lib_so', 
-    file_filter=None
+    target_dir='/tmp/lib_so',
+    file_filter=None,
+    s3_client=None
 ):
     """
     One-step setup for loading libraries from S3 with SnapStart integration
-    
+
     Args:
         bucket: The S3 bucket name
         key: The S3 object key
         base_path: The base path for original files (e.g., '/var/task', '/opt/ml/model')
         target_dir: The target directory for symbolic links
         file_filter: Optional file filter function, defaults to loading .so, .so.*, and .gguf files
-    
+        s3_client: Optional pre-built boto3 S3 client to reuse for the download
+
     Returns:
         bool: Whether the setup was successful
     """
@@ -49,7 +51,8 @@ def load_libraries_from_s3(
             key=key,
             file_filter=file_filter,
             base_path=base_path,
-            target_dir=target_dir
+            target_dir=target_dir,
+            s3_client=s3_client
         )
         
         # Register the SnapStart restore hook
@@ -6,47 +6,137 @@ import os
 import io
 import sys
 import zipfile
+import tarfile
 import logging
 import boto3
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional, Union, Callable
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 from .loader import create_memory_file, create_symlinks, register_memory_importer
 
 logger = logging.getLogger(__name__)
 
+# Range-GET download tuning: a single GetObject stream is capped by
+# per-connection TCP throughput, so large objects are fetched as parallel
+# 16 MB ranges instead
+_RANGE_CHUNK_SIZE = 16 * 1024 * 1024
+_RANGE_MAX_WORKERS = 16
+_RANGE_MIN_SIZE = 2 * _RANGE_CHUNK_SIZE
+
+def _parallel_download(s3_client, bucket: str, key: str, size: int) -> bytearray:
+    """
+    Downloads an S3 object with concurrent range GETs into a single buffer
+
+    Args:
+        s3_client: The boto3 S3 client to use
+        bucket: The S3 bucket name
+        key: The S3 object key
+        size: The object size in bytes (from HeadObject)
+
+    Returns:
+        bytearray: The full object content
+    """
+    buf = bytearray(size)
+    ranges = [
+        (start, min(start + _RANGE_CHUNK_SIZE, size) - 1)
+        for start in range(0, size, _RANGE_CHUNK_SIZE)
+    ]
+
+    def fetch(byte_range):
+        start, end = byte_range
+        response = s3_client.get_object(
+            Bucket=bucket, Key=key, Range=f'bytes={start}-{end}'
+        )
+        buf[start:end + 1] = response['Body'].read()
+
+    workers = min(_RANGE_MAX_WORKERS, len(ranges))
+    logger.info(f"Downloading {size / (1024 * 1024):.2f} MB in {len(ranges)} ranges with {workers} workers")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Consume the iterator so worker exceptions propagate
+        list(executor.map(fetch, ranges))
+
+    return buf
+
+def _is_zstd_archive(key: str) -> bool:
+    """
+    Checks whether an S3 key refers to a zstd-compressed tarball
+    """
+    return key.endswith('.tar.zst') or key.endswith('.tzst')
+
 def download_and_extract_from_s3(
-    bucket: str, 
-    key: str
+    bucket: str,
+    key: str,
+    s3_client=None
 ) -> Dict[str, bytes]:
     """
-    Downloads a ZIP file from S3 and extracts it to memory
-    
+    Downloads an archive (ZIP or zstd tarball) from S3 and extracts it to memory
+
+    For .tar.zst/.tzst keys the body is decompressed as a stream, so
+    extraction overlaps the S3 read instead of waiting for the full download.
+
     Args:
         bucket: The S3 bucket name
         key: The S3 object key
-    
+        s3_client: Optional pre-built boto3 S3 client to reuse
+
     Returns:
         Dict[str, bytes]: A mapping of file names to file contents
     """
     logger.info(f"Downloading from S3: s3://{bucket}/{key}")
-    
-    # Create S3 client
-    s3_client = boto3.client('s3')
-    
+
+    # Create S3 client if the caller didn't supply one
+    if s3_client is None:
+        s3_client = boto3.client('s3')
+
     try:
-        # Download file
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        zip_content = response['Body'].read()
-        
-        logger.info(f"Download complete, size: {len(zip_content) / (1024 * 1024):.2f} MB")
-        
-        # Extract to memory
         memory_fs = {}
-        with zipfile.ZipFile(io.BytesIO(zip_content), 'r') as zip_ref:
-            for file_name in zip_ref.namelist():
-                content = zip_ref.read(file_name)
-                memory_fs[file_name] = content
-        
+
+        # Fan out parallel range GETs for large objects; small objects and
+        # buckets where HeadObject is denied use a single GetObject stream
+        try:
+            size = s3_client.head_object(Bucket=bucket, Key=key)['ContentLength']
+        except Exception as e:
+            logger.debug(f"HeadObject failed, falling back to single GET: {e}")
+            size = None
+
+        if size is not None and size >= _RANGE_MIN_SIZE:
+            source = io.BytesIO(_parallel_download(s3_client, bucket, key, size))
+        else:
+            source = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+
+        if _is_zstd_archive(key):
+            if zstandard is None:
+                raise RuntimeError(
+                    "zstandard is required to extract .tar.zst archives: pip install zstandard"
+                )
+            # Stream source -> zstd decompressor -> tar reader
+            dctx = zstandard.ZstdDecompressor()
+            with dctx.stream_reader(source) as reader:
+                with tarfile.open(fileobj=reader, mode='r|') as tar:
+                    for member in tar:
+                        if not member.isfile():
+                            continue
+                        extracted = tar.extractfile(member)
+                        if extracted is not None:
+                            memory_fs[member.name] = extracted.read()
+        else:
+            # zipfile needs a seekable file, so buffer the stream case
+            if not isinstance(source, io.BytesIO):
+                source = io.BytesIO(source.read())
+
+            logger.info(f"Download complete, size: {source.getbuffer().nbytes / (1024 * 1024):.2f} MB")
+
+            # Extract to memory
+            with zipfile.ZipFile(source, 'r') as zip_ref:
+                for file_name in zip_ref.namelist():
+                    content = zip_ref.read(file_name)
+                    memory_fs[file_name] = content
+
         logger.info(f"Extraction complete, file count: {len(memory_fs)}")
         return memory_fs
     except Exception as e:
@@ -60,27 +150,29 @@ def stream_libraries_from_s3(
     key: str, 
     file_filter: Callable[[str], bool],
     base_path: str = '/var/task',
-    target_dir: str = '/tmp/lib_so'
+    target_dir: str = '/tmp/lib_so',
+    s3_client=None
 ) -> str:
     """
     Downloads library files from S3, loads them into memory, and creates symbolic links
-    
+
     Args:
         bucket: The S3 bucket name
         key: The S3 object key
         file_filter: Required file filter function to determine which files to load into memory
         base_path: Base path for original files
         target_dir: The target directory for symbolic links
-    
+        s3_client: Optional pre-built boto3 S3 client to reuse
+
     Returns:
         str: The symbolic link directory path
     """
     # file_filter must be provided by the caller
     if file_filter is None:
         raise ValueError("file_filter must be provided")
-    
+
     # Download and extract all files
-    memory_fs = download_and_extract_from_s3(bucket, key)
+    memory_fs = download_and_extract_from_s3(bucket, key, s3_client=s3_client)
     
     # Load .so files into memory files
     loaded_count = 0